@@ -1,7 +1,14 @@
 import serial
 import serial.tools.list_ports
+import bisect
+import hashlib
+import queue
+import re
+import threading
+import time
 import tkinter as tk
-from tkinter import messagebox, ttk
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tkinter import messagebox, ttk, filedialog
 
 # 调试开关
 DEBUG = True
@@ -10,15 +17,23 @@ def debug_print(message):
     if DEBUG:
         print(message)
 
+# 扫描深度
+DEPTH_IDENTITY = "Identity only"
+DEPTH_FULL = "Full image"
+
 # 获取可用的串口列表
 def get_serial_ports():
     ports = serial.tools.list_ports.comports()
     return [port.device for port in ports]
 
+# 串口名自然排序，COM2排在COM10之前
+def port_sort_key(port):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', port)]
+
 # 串口通信相关函数
 def open_serial(port, baudrate=9600):
     try:
-        ser = serial.Serial(port, baudrate, timeout=1)
+        ser = serial.Serial(port, baudrate, timeout=1, write_timeout=1)
         debug_print(f"Opened serial port {port} at baudrate {baudrate}")
         return ser
     except Exception as e:
@@ -26,131 +41,202 @@ def open_serial(port, baudrate=9600):
         return None
 
 def send_data(ser, data):
-    debug_print(f"Sending data: {data.hex().upper()}")
+    debug_print(f"[{ser.port}] Sending data: {data.hex().upper()}")
     ser.write(data)
 
 def receive_data(ser, length):
     data = ser.read(length)
-    debug_print(f"Received data: {data.hex().upper()}")
+    debug_print(f"[{ser.port}] Received data: {data.hex().upper()}")
     return data
 
-def process_config_data(data, index):
-    # 将数据按规则解析为频率和功能控制数据
-    try:
-        recv_freq_hex = data[4:7][::-1].hex().upper()
-        recv_freq_dec = (int(recv_freq_hex, 16) - 6445568) / 10**5 + 400
-        
-        send_freq_hex = data[8:11][::-1].hex().upper()
-        send_freq_dec = (int(send_freq_hex, 16) - 6445568) / 10**5 + 400
-        
-        recv_cts = int.from_bytes(data[12:14][::-1], byteorder='big') / 10
-        send_cts = int.from_bytes(data[14:16][::-1], byteorder='big') / 10
-        
-        control_byte = data[16]
-        control_bits = f"{control_byte:08b}"[-3:]  # 取后三位
-        busy_lock, encryption, frequency_hop = control_bits
-        
-        return {
-            'index': index,
-            'recv_freq': recv_freq_dec,
-            'send_freq': send_freq_dec,
-            'recv_cts': recv_cts,
-            'send_cts': send_cts,
-            'busy_lock': busy_lock,
-            'encryption': encryption,
-            'frequency_hop': frequency_hop
-        }
-    except Exception as e:
-        debug_print(f"Failed to process configuration data: {e}")
+# 握手，成功时返回0x05的身份应答，失败时返回None
+def handshake(ser):
+    send_data(ser, b'\x02\x54\x47\x53\x31\x52\x41\x4D')
+    response = receive_data(ser, 1)
+
+    if response != b'\x06':
+        send_data(ser, b'\x02\x54\x47\x53\x31\x52\x41\x4D')
+        response = receive_data(ser, 1)
+        if response != b'\x06':
+            return None
+
+    send_data(ser, b'\x02')
+    if receive_data(ser, 8) != b'\x06\x00\x00\x00\x00\x00\x00\x00':
         return None
 
-def read_configuration(ser):
-    config_data = []
+    send_data(ser, b'\x06')
+    if receive_data(ser, 1) != b'\x06':
+        return None
+
+    send_data(ser, b'\x05')
+    identity = receive_data(ser, 7)
+    if len(identity) != 7:
+        debug_print(f"[{ser.port}] Short identity reply: {identity.hex().upper()}")
+        return None
+
+    send_data(ser, b'\x06')
+    if receive_data(ser, 1) != b'\x06':
+        return None
+
+    return identity
+
+# 读取18条记录并计算摘要，遇到异常记录立即停止
+def read_image_digest(ser):
+    digest = hashlib.sha1()
     index = 0x00  # 起始序号
 
     for i in range(18):
         send_data(ser, bytes([0x52, 0x00, index, 0x0D]))  # 发送52 00 xx 0D
         response = receive_data(ser, 17)
-        if response.startswith(b'\x57\x00'):
-            config_data.append(process_config_data(response, index))
-        else:
-            debug_print(f"Unexpected response for index {index}: {response.hex().upper()}")
+        if len(response) != 17 or not response.startswith(b'\x57\x00'):
+            debug_print(f"[{ser.port}] Unexpected response for index {index}: {response.hex().upper()}")
+            return None
+        digest.update(response)
         index += 0x0D  # 每次序号增加13
 
-    return config_data
+    return digest.hexdigest()[:16].upper()
+
+# 扫描单个串口，返回一行报告
+def scan_port(port, depth):
+    start = time.perf_counter()
+    result = {'port': port, 'identity': "-", 'digest': "-", 'latency': 0.0}
 
-# UI相关函数
-def update_ui(config_data):
-    for i, data in enumerate(config_data):
-        label = tk.Label(frame, text=f"Channel {i+1}: {data}")
-        label.pack()
-
-def start_reading():
-    port = port_combobox.get()
-    if not port:
-        messagebox.showerror("Error", "Please select a serial port")
-        return
-    
     ser = open_serial(port)
     if not ser:
-        messagebox.showerror("Error", "Failed to open serial port")
-        return
-    
-    # 开始数据交互
-    send_data(ser, b'\x02\x54\x47\x53\x31\x52\x41\x4D')
-    response = receive_data(ser, 1)
-    
-    if response != b'\x06':
-        send_data(ser, b'\x02\x54\x47\x53\x31\x52\x41\x4D')
-        response = receive_data(ser, 1)
-        if response != b'\x06':
-            messagebox.showerror("Error", "Failed to communicate with the device")
-            return
-    
-    send_data(ser, b'\x02')
-    response = receive_data(ser, 8)
-    
-    if response == b'\x06\x00\x00\x00\x00\x00\x00\x00':
-        send_data(ser, b'\x06')
-        response = receive_data(ser, 1)
-        
-        if response == b'\x06':
-            send_data(ser, b'\x05')
-            response = receive_data(ser, 7)
-            
-            if response:
-                send_data(ser, b'\x06')
-                response = receive_data(ser, 1)
-                
-                if response == b'\x06':
-                    config_data = read_configuration(ser)
-                    update_ui(config_data)
-                else:
-                    messagebox.showerror("Error", "Failed during final handshake")
-            else:
-                messagebox.showerror("Error", "Unexpected response after sending 0x05")
-        else:
-            messagebox.showerror("Error", "Failed after sending 0x06")
+        result['identity'] = "Open failed"
     else:
-        messagebox.showerror("Error", "Failed during initial data exchange")
-    
-    ser.close()
+        try:
+            identity = handshake(ser)
+            if identity is None:
+                result['identity'] = "No response"
+            else:
+                result['identity'] = identity.hex().upper()
+        except Exception as e:
+            debug_print(f"[{port}] Scan failed: {e}")
+            result['identity'] = "Error"
+            identity = None
+
+        # 读取失败时保留已获得的身份信息
+        if identity is not None and depth == DEPTH_FULL:
+            try:
+                result['digest'] = read_image_digest(ser) or "Read failed"
+            except Exception as e:
+                debug_print(f"[{port}] Image read failed: {e}")
+                result['digest'] = "Read failed"
+
+        try:
+            ser.close()
+        except Exception as e:
+            debug_print(f"[{port}] Failed to close serial port: {e}")
+
+    result['latency'] = (time.perf_counter() - start) * 1000
+    return result
+
+# 所有串口同时扫描，每完成一个就放入结果队列
+def scan_all_ports(ports, depth, results):
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(ports), 1)) as executor:
+            futures = {executor.submit(scan_port, port, depth): (port, time.perf_counter()) for port in ports}
+            for future in as_completed(futures):
+                port, submitted = futures[future]
+                try:
+                    results.put(future.result())
+                except Exception as e:
+                    debug_print(f"[{port}] Scan failed: {e}")
+                    latency = (time.perf_counter() - submitted) * 1000
+                    results.put({'port': port, 'identity': "Error", 'digest': "-", 'latency': latency})
+    finally:
+        results.put(None)  # 扫描结束标记
+
+# UI相关函数
+scan_results = queue.Queue()
+report_rows = []
+
+def poll_results():
+    while True:
+        try:
+            row = scan_results.get_nowait()
+        except queue.Empty:
+            root.after(50, poll_results)
+            return
+        if row is None:
+            scan_button.config(state=tk.NORMAL)
+            status_var.set(f"Scanned {len(report_rows)} port(s)")
+            return
+        # 按串口名排序插入，保证每次报告顺序一致
+        position = bisect.bisect(report_rows, port_sort_key(row['port']), key=lambda r: port_sort_key(r['port']))
+        report_rows.insert(position, row)
+        report_tree.insert("", position, values=(
+            row['port'], row['identity'], row['digest'], f"{row['latency']:.0f}"))
+
+def start_scan():
+    ports = get_serial_ports()
+    if not ports:
+        messagebox.showerror("Error", "No serial ports found")
+        return
+
+    report_rows.clear()
+    report_tree.delete(*report_tree.get_children())
+    scan_button.config(state=tk.DISABLED)
+    status_var.set(f"Scanning {len(ports)} port(s)...")
+
+    # 在后台线程中扫描，避免阻塞界面
+    threading.Thread(target=scan_all_ports, args=(ports, depth_combobox.get(), scan_results),
+                     daemon=True).start()
+    root.after(50, poll_results)
+
+def save_report():
+    if not report_rows:
+        messagebox.showerror("Error", "Nothing to save, please scan first")
+        return
+
+    filename = filedialog.asksaveasfilename(
+        defaultextension=".txt",
+        filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+        title="Save Inventory Report",
+        initialfile="inventory.txt"
+    )
+    if not filename:
+        return
+
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write("port\tidentity\tdigest\tlatency_ms\n")
+            for row in report_rows:
+                f.write(f"{row['port']}\t{row['identity']}\t{row['digest']}\t{row['latency']:.0f}\n")
+    except Exception as e:
+        messagebox.showerror("Error", f"Failed to save report: {e}")
 
 # 创建UI
 root = tk.Tk()
-root.title("Configuration Reader")
+root.title("Fleet Inventory Scanner")
 
 frame = tk.Frame(root)
 frame.pack(padx=10, pady=10)
 
-port_label = tk.Label(frame, text="Select Serial Port:")
-port_label.pack(side=tk.LEFT)
+depth_label = tk.Label(frame, text="Scan Depth:")
+depth_label.grid(row=0, column=0)
+
+# 扫描深度选择下拉列表
+depth_combobox = ttk.Combobox(frame, values=[DEPTH_IDENTITY, DEPTH_FULL], state="readonly", width=15)
+depth_combobox.set(DEPTH_IDENTITY)
+depth_combobox.grid(row=0, column=1)
+
+scan_button = tk.Button(frame, text="Scan All Ports", command=start_scan)
+scan_button.grid(row=0, column=2, padx=2)
+
+save_button = tk.Button(frame, text="Save Report", command=save_report)
+save_button.grid(row=0, column=3, padx=2)
 
-# 串口选择下拉列表
-port_combobox = ttk.Combobox(frame, values=get_serial_ports())
-port_combobox.pack(side=tk.LEFT)
+# 报告表格
+columns = ("Port", "Identity", "Digest", "Latency (ms)")
+report_tree = ttk.Treeview(frame, columns=columns, show="headings", height=16)
+for col in columns:
+    report_tree.heading(col, text=col)
+    report_tree.column(col, width=140)
+report_tree.grid(row=1, column=0, columnspan=4, pady=5)
 
-start_button = tk.Button(frame, text="Start Reading", command=start_reading)
-start_button.pack(side=tk.LEFT)
+status_var = tk.StringVar(value="Ready")
+tk.Label(frame, textvariable=status_var).grid(row=2, column=0, columnspan=4, sticky=tk.W)
 
 root.mainloop()